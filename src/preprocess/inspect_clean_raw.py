@@ -10,9 +10,15 @@ Created on Aug 9, 2025
 '''
 
 
+import functools
+import hashlib
+import os
 import util.main_data_io as mainIO
+import util.time_helpers as th
 import pandas as pd
-from pandas import StringDtype
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
 
 # =========================
 # 👇 CONFIG: KEYS & STRATEGY
@@ -20,6 +26,11 @@ from pandas import StringDtype
 USE_THREE_KEY = True  # Set to True if split shifts may exist (recommended)
 KEYS = ["employee_id", "date", "clock_in"] if USE_THREE_KEY else ["employee_id", "date"]
 
+# Helper column holding one uint64 hash of the KEYS tuple, added by
+# normalize_key_columns so dedup/report steps group on a single integer column.
+# Dropped before anything is saved.
+KEY_HASH_COL = "__key_hash__"
+
 # De-duplication strategy when duplicates are detected:
 #   - "error": raise with a preview (safest during development)
 #   - "keep_last": keep the last occurrence for each key
@@ -35,6 +46,10 @@ CRITICAL_COLS = [
     "employment_status", "exempt_status"
 ]
 
+# Print df.info(), null counts and text value counts during cleaning.
+# Each is a full-frame scan, so keep off for batch runs.
+VERBOSE_INSPECTION = False
+
 # -----------------------
 # Predefined normalization mappings for text fields
 # Keys must reflect post-clean values (lowercase, underscores, no slashes)
@@ -54,6 +69,11 @@ MAPPINGS = {
     },
 }
 
+# Separators folded to "_" by standardize_text_columns in a single regex pass.
+# Kept as a plain pattern string: pandas hands it to pyarrow's
+# replace_substring_regex for Arrow strings (a compiled re.Pattern would not be).
+_SEPARATOR_PATTERN = r"[-/ ]"
+
 def inspect_data(df: pd.DataFrame):
     print(df.info())
     print("\nNumber of null entries per column:\n")
@@ -68,53 +88,128 @@ def standardize_text_columns(df: pd.DataFrame, mappings: dict) -> pd.DataFrame:
     df = df.copy()
     for col, map_dict in mappings.items():
         if col in df.columns:
-            s = df[col].astype(StringDtype())
-            s = (
-                s.str.strip()
-                 .str.lower()
-                 .str.replace("-", "_", regex=False)
-                 .str.replace(" ", "_", regex=False)
-                 .str.replace("/", "_", regex=False)
+            # Status columns are low-cardinality: clean the distinct values once
+            # and rebuild the column from the categorical codes
+            cat = df[col].astype("category")
+            cats = cat.cat.categories
+            # Only convert when the categories aren't already a string dtype;
+            # object values go to Arrow strings so .str runs on Arrow kernels
+            if not pd.api.types.is_string_dtype(cats) or cats.dtype == object:
+                cats = cats.astype("string[pyarrow]")
+            cats = (
+                pd.Index(cats)
+                  .str.strip()
+                  .str.lower()
+                  .str.replace(_SEPARATOR_PATTERN, "_", regex=True)
             )
             if map_dict:
-                s = s.replace(map_dict)
-            df[col] = s
+                cats = pd.Index(cats.to_series().replace(map_dict))
+            # Several raw spellings can collapse into one value; remap codes onto
+            # the unique cleaned categories (trailing -1 keeps missing as missing)
+            inverse, new_cats = pd.factorize(cats)
+            lookup = np.append(inverse, -1)
+            codes = lookup[cat.cat.codes.to_numpy()]
+            # Callers get the same "string" dtype as before; the categorical is
+            # only a device for cleaning each distinct value once
+            df[col] = pd.Categorical.from_codes(codes, categories=new_cats).astype("string")
     return df
 
 # ===========================================
 # 👉 NEW: KEY NORMALIZATION + DEDUP FUNCTIONS
 # ===========================================
+def normalize_employee_ids(s: pd.Series) -> pd.Series:
+    """
+    Trim and uppercase employee IDs. Arrow-backed strings go through
+    pyarrow.compute in one pass; anything else falls back to the .str chain.
+    """
+    if isinstance(s.dtype, pd.ArrowDtype) and pa.types.is_string(s.dtype.pyarrow_dtype):
+        arr = pc.utf8_upper(pc.utf8_trim_whitespace(pa.array(s)))
+        return pd.Series(pd.arrays.ArrowExtensionArray(arr), index=s.index, name=s.name)
+    return s.astype("string").str.strip().str.upper()
+
 def normalize_key_columns(df: pd.DataFrame) -> pd.DataFrame:
     """
     Normalize merge keys consistently.
     - employee_id: uppercase + trimmed
     - date: normalized to midnight datetime (keeps datetime dtype)
     - clock_in (if used): floor to minute to avoid microsecond drift
+    Only the key columns are rebuilt; the rest are shared with the input.
     """
-    out = df.copy()
+    out = df.copy(deep=False)
     if "employee_id" in out.columns:
-        out["employee_id"] = out["employee_id"].astype(str).str.strip().str.upper()
+        out["employee_id"] = normalize_employee_ids(out["employee_id"])
+    # th.floor_datetimes always returns th.DATETIME_UNIT, so key hashes (which
+    # differ per unit) match across the clean and merge steps
     if "date" in out.columns:
-        out["date"] = pd.to_datetime(out["date"], errors="coerce").dt.normalize()
+        out["date"] = th.floor_datetimes(out["date"], "D")
     if USE_THREE_KEY and "clock_in" in out.columns:
-        out["clock_in"] = pd.to_datetime(out["clock_in"], errors="coerce").dt.floor("min")
-    return out
+        out["clock_in"] = th.floor_datetimes(out["clock_in"], "m")
+    return add_key_hash(out)
+
+def add_key_hash(df: pd.DataFrame, keys: list = None) -> pd.DataFrame:
+    """
+    Store a uint64 hash of the key columns (default KEYS) in KEY_HASH_COL.
+    Keys must already be normalized so equal keys hash equally.
+    """
+    keys = keys or KEYS
+    df[KEY_HASH_COL] = pd.util.hash_pandas_object(df[keys], index=False).to_numpy()
+    return df
+
+def _key_hashes(df: pd.DataFrame) -> pd.Series:
+    """KEY_HASH_COL if present, otherwise the key hash computed on the fly."""
+    if KEY_HASH_COL in df.columns:
+        return df[KEY_HASH_COL]
+    return pd.util.hash_pandas_object(df[KEYS], index=False)
+
+def _key_group_ids(df: pd.DataFrame) -> np.ndarray:
+    """
+    One int64 group id per row, equal exactly when the KEYS values are equal.
+    Rows are grouped on the 64-bit key hash first; only rows whose hash repeats
+    (the duplicate candidates, normally few) are regrouped on the KEYS values
+    themselves, so a hash collision can never merge two different keys.
+    """
+    hashes = _key_hashes(df)
+    ids = pd.factorize(hashes.to_numpy())[0].astype(np.int64)
+    candidates = np.flatnonzero(hashes.duplicated(keep=False).to_numpy())
+    if len(candidates):
+        exact = df.iloc[candidates].groupby(KEYS, dropna=False, sort=False).ngroup().to_numpy()
+        # offset past the hash codes (all < len(df)) so the two id ranges can't clash
+        ids[candidates] = len(df) + exact
+    return ids
+
+def _duplicate_key_counts(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Keys that occur more than once, with their row count, most frequent first.
+    """
+    ids = _key_group_ids(df)
+    row_counts = np.bincount(ids)[ids]
+    # one representative row per duplicated key supplies the readable key values
+    first = (row_counts > 1) & ~pd.Series(ids).duplicated().to_numpy()
+    dup_df = df.loc[first, KEYS].reset_index(drop=True)
+    dup_df["count"] = row_counts[first]
+    return dup_df.sort_values("count", ascending=False, kind="stable").reset_index(drop=True)
 
 def duplicate_key_report(df: pd.DataFrame, dataset_name: str, export_csv: bool = True,
-                         client_name: str = None, filename: str = None) -> pd.DataFrame:
+                         client_name: str = None, filename: str = None,
+                         verbose: bool = None) -> pd.DataFrame:
     """
-    Return a dataframe of duplicated keys (with count), print a quick preview,
-    and optionally export a CSV for auditing.
+    Return a dataframe of duplicated keys (with count), print a quick preview
+    when verbose, and optionally export a CSV for auditing.
     """
-    dup_mask = df.duplicated(subset=KEYS, keep=False)
-    dup_df = (df.loc[dup_mask, KEYS]
-                .value_counts()
-                .reset_index(name="count")
-                .sort_values("count", ascending=False))
-    total_dups = dup_mask.sum()
+    dup_df = _duplicate_key_counts(df)
+    _print_and_export_duplicates(dup_df, dataset_name, export_csv, client_name, filename, verbose)
+    return dup_df
+
+def _print_and_export_duplicates(dup_df: pd.DataFrame, dataset_name: str, export_csv: bool,
+                                 client_name: str, filename: str, verbose: bool) -> None:
+    """Output side of duplicate_key_report, also replayed for cached reports."""
+    if verbose is None:
+        verbose = VERBOSE_INSPECTION
+    total_dups = int(dup_df["count"].sum())
     if total_dups:
         print(f"\n{dataset_name}: found {total_dups} duplicate-key rows on {KEYS}.")
-        print(dup_df.head(10).to_string(index=False))
+        if verbose:
+            print(dup_df.head(10).to_string(index=False))
         if export_csv and client_name and filename:
             # export beside cleaned file
             try:
@@ -126,102 +221,189 @@ def duplicate_key_report(df: pd.DataFrame, dataset_name: str, export_csv: bool =
                 print(f"Warning: could not save duplicate report: {e}")
     else:
         print(f"\n{dataset_name}: no duplicate keys found on {KEYS}.")
-    return dup_df
+
+@functools.lru_cache(maxsize=32)
+def _present_critical(columns: frozenset) -> tuple:
+    """CRITICAL_COLS present in a column set, in CRITICAL_COLS order (cached per layout)."""
+    return tuple(c for c in CRITICAL_COLS if c in columns)
 
 def _keep_best_non_nulls(df: pd.DataFrame) -> pd.DataFrame:
     """
     For each key group, keep the row with the highest non-null score across CRITICAL_COLS.
-    Ties are resolved by 'last' occurrence.
+    Ties are resolved by 'last' occurrence. Surviving rows keep their original order.
     """
-    work = df.copy()
-    # non-null score
-    present_cols = [c for c in CRITICAL_COLS if c in work.columns]
-    score_name = "__nn_score__"
-    work[score_name] = work[present_cols].notna().sum(axis=1)
-    # stable ordering: original index -> last wins on ties
-    work["__orig_idx__"] = range(len(work))
-    # sort so best score then by original index ascending — we’ll take last to prefer latest
-    work = work.sort_values([*KEYS, score_name, "__orig_idx__"])
-    deduped = work.drop_duplicates(subset=KEYS, keep="last").drop(columns=[score_name, "__orig_idx__"])
-    return deduped
-
-def deduplicate_by_strategy(df: pd.DataFrame, dataset_name: str) -> pd.DataFrame:
-    """
-    Apply the configured de-dup strategy.
-    """
-    dup_mask = df.duplicated(subset=KEYS, keep=False)
-    if not dup_mask.any():
+    n = len(df)
+    if n == 0:
         return df
+    # non-null score
+    present_cols = _present_critical(frozenset(df.columns))
+    # accumulate per-column notna masks straight into one small int array
+    # instead of materializing an (N, K) boolean DataFrame
+    score = np.zeros(n, dtype=np.int16)
+    for col in present_cols:
+        score += df[col].notna().to_numpy()
+    # fold score and position into one int64 so a group max picks the best
+    # score and, on ties, the latest row — no global sort needed
+    combined = score.astype(np.int64) * n + np.arange(n, dtype=np.int64)
+    best = (pd.Series(combined)
+              .groupby(_key_group_ids(df), sort=False)
+              .max()
+              .to_numpy())
+    return df.iloc[np.sort(best % n)]
 
+def deduplicate_by_strategy(df: pd.DataFrame, dataset_name: str,
+                            dup_report: pd.DataFrame = None) -> pd.DataFrame:
+    """
+    Apply the configured de-dup strategy. Both keep strategies are no-ops on
+    unique keys, so no up-front duplicate check is made. Pass the frame returned
+    by duplicate_key_report as dup_report to reuse it for the "error" strategy.
+    """
     if DEDUP_STRATEGY == "error":
-        dup_df = (df.loc[dup_mask, KEYS]
-                    .value_counts()
-                    .reset_index(name="count")
-                    .sort_values("count", ascending=False))
+        dup_df = dup_report if dup_report is not None else _duplicate_key_counts(df)
+        if dup_df.empty:
+            return df
         raise ValueError(
             f"[{dataset_name}] duplicate keys detected on {KEYS}. "
             f"Examples:\n{dup_df.head(15).to_string(index=False)}"
         )
     elif DEDUP_STRATEGY == "keep_last":
-        return df.drop_duplicates(subset=KEYS, keep="last")
+        return df.groupby(_key_group_ids(df), sort=False).tail(1)
     elif DEDUP_STRATEGY == "keep_best_non_nulls":
         return _keep_best_non_nulls(df)
     else:
         raise ValueError(f"Unknown DEDUP_STRATEGY: {DEDUP_STRATEGY}")
 
+@functools.lru_cache(maxsize=1)
+def _code_fingerprint() -> bytes:
+    """
+    Hash of the source of the modules that shape the cleaned output (this module,
+    the raw loader and the datetime helpers) plus the pandas/pyarrow versions, so
+    any change to the cleaning code invalidates cached results by itself.
+    """
+    h = hashlib.sha256()
+    for path in (__file__, mainIO.__file__, th.__file__):
+        with open(path, "rb") as f:
+            h.update(f.read())
+    h.update(f"{pd.__version__}|{pa.__version__}".encode("utf-8"))
+    return h.digest()
+
+def _cache_key(raw_path: str) -> str:
+    """
+    Content hash of the raw file plus the cleaning code and config, used to
+    look up a previously cleaned dataset.
+    """
+    h = hashlib.sha256()
+    with open(raw_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    h.update(_code_fingerprint())
+    config = (USE_THREE_KEY, DEDUP_STRATEGY, MAPPINGS, CRITICAL_COLS)
+    h.update(repr(config).encode("utf-8"))
+    return h.hexdigest()
+
+def _save_cleaned(df: pd.DataFrame, client_name: str, filename: str, export_csv: bool) -> None:
+    # Parquet is written last so it is the newer file; load_cleaned_data only
+    # picks the CSV when it has been changed since
+    if export_csv:
+        mainIO.save_cleaned_raw_data(df, client_name, filename)
+    mainIO.save_cleaned_raw_data_parquet(df, client_name, filename)
+
 # ===========================
 # Existing high-level routines
 # ===========================
-def initial_inspection(client_name="missing_client", filename="missing_filename") -> pd.DataFrame:
+def initial_inspection(client_name="missing_client", filename="missing_filename",
+                       use_cache: bool = True, verbose: bool = None,
+                       export_csv: bool = True) -> pd.DataFrame:
     """
     Performs initial inspection and normalization of a client’s raw dataset.
+    The cleaned dataset is saved as Parquet, plus a CSV copy when export_csv is set.
+    When use_cache is set and the raw file and config are unchanged since a
+    previous run, the cached cleaned dataset is returned without re-cleaning.
+    Inspection printouts only run when verbose (default: VERBOSE_INSPECTION).
     """
+    if verbose is None:
+        verbose = VERBOSE_INSPECTION
+    dataset_name = "RAW→CLEAN (post-standardize)"
+    cache_key = None
+    if use_cache:
+        raw_path = mainIO.get_raw_data_path(client_name, filename)
+        if os.path.exists(raw_path):
+            cache_key = _cache_key(raw_path)
+            df_cached = mainIO.load_cached_data(client_name, cache_key)
+            # The duplicate report is cached beside the frame so a hit still
+            # writes it; a hit missing either part is treated as a miss
+            dup_cached = (mainIO.load_cached_data(client_name, f"{cache_key}_dups")
+                          if df_cached is not None else None)
+            if dup_cached is not None:
+                _print_and_export_duplicates(dup_cached, dataset_name, True,
+                                             client_name, filename, verbose)
+                _save_cleaned(df_cached, client_name, filename, export_csv)
+                return df_cached
+
     df = mainIO.load_raw_data(client_name, filename)
 
     # Inspection
-    inspect_data(df)
     text_columns = ["employment_status", "exempt_status"]
-    inspect_text_values(df, text_columns)
+    if verbose:
+        inspect_data(df)
+        inspect_text_values(df, text_columns)
 
     # Standardize text
     df_clean = standardize_text_columns(df, MAPPINGS)
 
     # 👉 Normalize merge keys & check dupes
     df_clean = normalize_key_columns(df_clean)
-    _ = duplicate_key_report(df_clean, dataset_name="RAW→CLEAN (post-standardize)",
-                             export_csv=True, client_name=client_name, filename=filename)
-    df_clean = deduplicate_by_strategy(df_clean, dataset_name="RAW→CLEAN")
+    dup_report = duplicate_key_report(df_clean, dataset_name=dataset_name,
+                                      export_csv=True, client_name=client_name, filename=filename,
+                                      verbose=verbose)
+    df_clean = deduplicate_by_strategy(df_clean, dataset_name="RAW→CLEAN",
+                                       dup_report=dup_report)
+    df_clean = df_clean.drop(columns=KEY_HASH_COL)
 
-    print("\nAfter standardization:")
-    inspect_text_values(df_clean, text_columns)
+    if verbose:
+        print("\nAfter standardization:")
+        inspect_text_values(df_clean, text_columns)
 
     # Save cleaned dataset
-    mainIO.save_cleaned_raw_data(df_clean, client_name, filename)
+    _save_cleaned(df_clean, client_name, filename, export_csv)
+    if cache_key:
+        # Report first: the frame is then the newer entry, evicted after it
+        mainIO.save_cached_data(dup_report, client_name, f"{cache_key}_dups")
+        mainIO.save_cached_data(df_clean, client_name, cache_key)
     return df_clean
 
 def clean_corrected_data(df_corrected: pd.DataFrame,
                          client_name: str = None,
-                         filename: str = None) -> pd.DataFrame:
+                         filename: str = None,
+                         verbose: bool = None) -> pd.DataFrame:
     """
     Cleans a corrected dataset consistently with RAW→CLEAN rules,
     normalizes keys, reports + resolves duplicates based on strategy.
+    Inspection printouts only run when verbose (default: VERBOSE_INSPECTION).
     """
-    inspect_data(df_corrected)
+    if verbose is None:
+        verbose = VERBOSE_INSPECTION
     text_columns = ["employment_status", "exempt_status"]
-    inspect_text_values(df_corrected, text_columns)
+    if verbose:
+        inspect_data(df_corrected)
+        inspect_text_values(df_corrected, text_columns)
 
     df_clean = standardize_text_columns(df_corrected, MAPPINGS)
 
     # 👉 Normalize keys & enforce uniqueness for corrected too
     df_clean = normalize_key_columns(df_clean)
-    _ = duplicate_key_report(df_clean, dataset_name="CORRECTED (post-standardize)",
-                             export_csv=True, client_name=client_name, filename=filename)
-    df_clean = deduplicate_by_strategy(df_clean, dataset_name="CORRECTED")
+    dup_report = duplicate_key_report(df_clean, dataset_name="CORRECTED (post-standardize)",
+                                      export_csv=True, client_name=client_name, filename=filename,
+                                      verbose=verbose)
+    df_clean = deduplicate_by_strategy(df_clean, dataset_name="CORRECTED",
+                                       dup_report=dup_report)
+    df_clean = df_clean.drop(columns=KEY_HASH_COL)
 
-    print("\nAfter standardization:")
-    inspect_text_values(df_clean, text_columns)
+    if verbose:
+        print("\nAfter standardization:")
+        inspect_text_values(df_clean, text_columns)
     return df_clean
 
 # For testing/debugging from CLI
 if __name__ == '__main__':
-    initial_inspection(client_name="test_client", filename="jan_2024_test_data")
+    initial_inspection(client_name="test_client", filename="jan_2024_test_data", verbose=True)
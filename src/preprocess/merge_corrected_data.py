@@ -4,50 +4,93 @@ merge_corrected.py
 Integrates corrected timecard entries into the cleaned dataset.
 
 - Loads cleaned + corrected
+- Casts corrected columns to the cleaned dtypes
 - Normalizes keys
 - Appends corrected after cleaned
-- Drop-duplicates by (employee_id, date, clock_in) keeping the last
+- Corrected rows replace cleaned rows with the same (employee_id, date, clock_in)
 - Saves merged back to cleaned folder
 
 Author: John Medina
 Created on: August 5, 2025
 """
 
+import numpy as np
 import pandas as pd
 import util.main_data_io as mainIO
 import preprocess.inspect_clean_raw as cleanRaw
+import util.time_helpers as th
 
 KEYS = ["employee_id", "date", "clock_in"]  # 3-key to allow split shifts safely
 
 def normalize_key_columns(df: pd.DataFrame) -> pd.DataFrame:
     """Standardize key columns: ID uppercase, date normalized, clock_in floored to minute."""
-    out = df.copy()
+    out = df.copy(deep=False)
 
     if "employee_id" in out.columns:
-        out["employee_id"] = (
-            out["employee_id"].astype("string").str.strip().str.upper()
-        )
+        out["employee_id"] = cleanRaw.normalize_employee_ids(out["employee_id"])
 
     if "date" in out.columns:
-        out["date"] = pd.to_datetime(out["date"], errors="coerce").dt.normalize()
+        out["date"] = th.floor_datetimes(out["date"], "D")
 
     if "clock_in" in out.columns:
         # Keep time (don’t downcast to date); floor to minute for stable equality
-        out["clock_in"] = pd.to_datetime(out["clock_in"], errors="coerce").dt.floor("min")
+        out["clock_in"] = th.floor_datetimes(out["clock_in"], "m")
+
+    return cleanRaw.add_key_hash(out, KEYS)
+
+
+def match_cleaned_dtypes(df_corr: pd.DataFrame, df_clean: pd.DataFrame) -> pd.DataFrame:
+    """
+    Give the corrected rows the column types of the cleaned dataset before they are
+    appended. The corrected CSV is read untyped, so without this its timestamps stay
+    strings and the merged columns end up mixing text and datetimes.
+
+    Parameters:
+        df_corr (pd.DataFrame): Cleaned corrected rows.
+        df_clean (pd.DataFrame): Cleaned dataset whose dtypes are the target.
 
-    return out
+    Returns:
+        pd.DataFrame: df_corr with each shared column cast to df_clean's dtype.
+
+    Raises:
+        ValueError / TypeError: If a corrected value can't be cast to the cleaned type.
+    """
+    out = df_corr.copy(deep=False)
+    shared = [col for col in out.columns if col in df_clean.columns]
+    targets = {col: df_clean[col].dtype for col in shared if out[col].dtype != df_clean[col].dtype}
+
+    # Timestamps are parsed the same way as the DQ step (unparseable values become NaT)
+    datetime_cols = [col for col, dtype in targets.items() if pd.api.types.is_datetime64_any_dtype(dtype)]
+    th.convert_dates_and_datetimes(out, datetime_cols=datetime_cols)
+
+    return out.astype(targets)
 
 
 def append_and_deduplicate(df_clean: pd.DataFrame, df_corr: pd.DataFrame) -> pd.DataFrame:
     """
-    Append cleaned + corrected (corrected last), then drop duplicates by KEYS keeping the last.
-    Assumes both inputs are already normalized on KEYS.
+    Append cleaned + corrected (corrected last), with corrected rows replacing cleaned
+    rows that share the same KEYS.
+    Assumes both inputs went through normalize_key_columns (key hash present)
+    and are de-duplicated on KEYS.
     """
-    combined = pd.concat([df_clean, df_corr], ignore_index=True)
-    print(f"\nCombined rows (pre-dedup): {len(combined)}")
+    # Only cleaned rows whose keys have no correction survive; the lookup is built
+    # over the (small) corrected set of key hashes added by normalize_key_columns
+    key_hash = cleanRaw.KEY_HASH_COL
+    keep = ~df_clean[key_hash].isin(df_corr[key_hash]).to_numpy()
+    # Confirm the hash hits on the KEYS values themselves, so a 64-bit collision
+    # can't drop a cleaned row that has no correction; only the hits are compared
+    hits = np.flatnonzero(~keep)
+    if len(hits):
+        matched = (
+            df_clean.iloc[hits][KEYS]
+              .merge(df_corr[KEYS].drop_duplicates(), how="left", indicator=True)["_merge"]
+              .eq("both")
+              .to_numpy()
+        )
+        keep[hits[~matched]] = True
+    print(f"\nCorrected rows: {len(df_corr)} | replacing cleaned rows: {int((~keep).sum())}")
 
-    # Keep corrected rows where keys match, preserve originals where they don't
-    merged = combined.drop_duplicates(subset=KEYS, keep="last").reset_index(drop=True)
+    merged = pd.concat([df_clean[keep], df_corr], ignore_index=True)
 
     print(f"Rows before: {len(df_clean)} | after merge: {len(merged)}")
     return merged
@@ -58,8 +101,9 @@ def merge_data(
     proc_filename: str = "missing_proc_filename",
     client_name: str = "missing_client_name",
     data_root: str = "../../data",
+    export_csv: bool = True,
 ) -> pd.DataFrame:
-    """Main entry: load → clean corrected → normalize → append+dedupe → save."""
+    """Main entry: load → clean corrected → normalize → append+dedupe → save (Parquet, optional CSV)."""
     # Load datasets
     df_corr_raw = mainIO.load_corrected_data(client_name, corr_filename, data_root)
     df_clean_raw = mainIO.load_cleaned_data(client_name, proc_filename, data_root)
@@ -68,6 +112,9 @@ def merge_data(
     # (Pass client/filename if your cleaner writes aux reports)
     df_corr_clean = cleanRaw.clean_corrected_data(df_corr_raw, client_name=client_name, filename=corr_filename)
 
+    # Same column types as the cleaned data, so the merged columns stay typed
+    df_corr_clean = match_cleaned_dtypes(df_corr_clean, df_clean_raw)
+
     # Normalize keys for both
     df_clean = normalize_key_columns(df_clean_raw)
     df_corr  = normalize_key_columns(df_corr_clean)
@@ -77,14 +124,17 @@ def merge_data(
     # print("Corrected dupes on KEYS:", df_corr.duplicated(subset=KEYS).sum())
 
     # Merge
-    merged = append_and_deduplicate(df_clean, df_corr)
+    merged = append_and_deduplicate(df_clean, df_corr).drop(columns=cleanRaw.KEY_HASH_COL)
 
     # Post-condition (row count should not drop unless corrected intentionally removes a row)
     # If you require exact preservation, assert here:
     # assert len(merged) >= len(df_clean), "Merged result lost rows unexpectedly."
 
     # Save back to cleaned so DQ jobs can run without a corrected flag
-    mainIO.save_cleaned_raw_data(merged, client_name, proc_filename)
+    # (CSV first, so the Parquet is the newer file load_cleaned_data prefers)
+    if export_csv:
+        mainIO.save_cleaned_raw_data(merged, client_name, proc_filename)
+    mainIO.save_cleaned_raw_data_parquet(merged, client_name, proc_filename)
     print("Merged dataset saved to cleaned.")
 
     return merged
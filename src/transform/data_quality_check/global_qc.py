@@ -7,8 +7,50 @@ Created on Aug 12, 2025
 import util.time_helpers as th 
 import util.main_data_io as mainIO
 import pandas as pd 
+import numpy as np
 import reporting.report_incomplete_rows as repInc
 
+try:
+    from numba import njit, prange
+except ImportError:  # numba is optional; the numpy kernel below is used instead
+    njit = None
+
+# Critical-field checks as (issue label, column that must be present,
+# column whose presence makes it required or None if always required).
+# Bit i of a row's issue bitmask corresponds to CRITICAL_CHECKS[i].
+CRITICAL_CHECKS = [
+    # Required time columns
+    ("missing clock_in", "clock_in", None),
+    ("missing clock_out", "clock_out", None),
+
+    # Partial lunch issues
+    ("missing lunch_end (partial lunch)", "lunch_end", "lunch_start"),
+    ("missing lunch_start (partial lunch)", "lunch_start", "lunch_end"),
+    ("missing second_lunch_end (partial second lunch)", "second_lunch_end", "second_lunch_start"),
+    ("missing second_lunch_start (partial second lunch)", "second_lunch_start", "second_lunch_end"),
+
+    # Required pay fields
+    ("missing wage_rate", "wage_rate", None),
+    ("missing total_pay_actual", "total_pay_actual", None),
+    ("missing pay_date", "pay_date", None),
+
+    # Required employee info
+    ("missing employment_status", "employment_status", None),
+    ("missing exempt_status", "exempt_status", None),
+    ("missing employee_id", "employee_id", None),
+    ("missing work date", "date", None),
+]
+
+# Kernel inputs derived from CRITICAL_CHECKS once at import: the distinct columns
+# involved, and for each check the index of its column and of its required-if column
+_CHECK_COLS = list(dict.fromkeys(
+    c for _, col, req in CRITICAL_CHECKS for c in (col, req) if c is not None
+))
+_CHECK_COL_IDX = np.array([_CHECK_COLS.index(col) for _, col, _ in CRITICAL_CHECKS], dtype=np.int64)
+_CHECK_REQ_IDX = np.array([_CHECK_COLS.index(req) if req else -1 for _, _, req in CRITICAL_CHECKS],
+                          dtype=np.int64)
+_CHECK_LABELS = np.array([label for label, _, _ in CRITICAL_CHECKS])
+
 def date_and_time_conversions(df):
     """
     Converts specified date and datetime columns to appropriate datetime formats.
@@ -32,10 +74,67 @@ def date_and_time_conversions(df):
     # Columns that contain time information and must retain full datetime
     datetime_cols = ["clock_in", "clock_out", "lunch_start", "lunch_end"]
 
-    # Convert using a shared helper function
-    df_time_converted = th.convert_dates_and_datetimes(df, date_cols, datetime_cols)
+    # Convert using a shared helper function (converts df in place)
+    th.convert_dates_and_datetimes(df, date_cols, datetime_cols)
+
+    return df
+
+def _issue_bits_numpy(isna, col_idx, req_idx):
+    """Column-at-a-time numpy version of the issue bitmask kernel."""
+    bits = np.zeros(isna.shape[0], dtype=np.uint32)
+    for j in range(len(col_idx)):
+        hit = isna[:, col_idx[j]]
+        if req_idx[j] >= 0:
+            hit = hit & ~isna[:, req_idx[j]]
+        bits |= hit.astype(np.uint32) << np.uint32(j)
+    return bits
+
+if njit is not None:
+    @njit(parallel=True, cache=True)
+    def _issue_bits_numba(isna, col_idx, req_idx):
+        """Single parallel sweep over rows building each row's issue bitmask."""
+        n = isna.shape[0]
+        bits = np.zeros(n, dtype=np.uint32)
+        for i in prange(n):
+            b = 0
+            for j in range(col_idx.shape[0]):
+                if isna[i, col_idx[j]] and (req_idx[j] < 0 or not isna[i, req_idx[j]]):
+                    b |= 1 << j
+            bits[i] = b
+        return bits
+
+def critical_issue_bits(df: pd.DataFrame) -> np.ndarray:
+    """
+    Computes a uint32 bitmask per row where bit i is set if CRITICAL_CHECKS[i] fails.
+    Columns absent from the DataFrame count as missing.
+
+    Parameters:
+        df (pd.DataFrame): The cleaned DataFrame to inspect.
+
+    Returns:
+        np.ndarray: uint32 array with one bitmask per row.
+    """
+    isna = np.ones((len(df), len(_CHECK_COLS)), dtype=np.bool_)
+    for k, col in enumerate(_CHECK_COLS):
+        if col in df.columns:
+            isna[:, k] = df[col].isna().to_numpy()
 
-    return df_time_converted
+    kernel = _issue_bits_numba if njit is not None else _issue_bits_numpy
+    return kernel(isna, _CHECK_COL_IDX, _CHECK_REQ_IDX)
+
+def issue_bits_to_lists(bits: np.ndarray) -> np.ndarray:
+    """
+    Converts issue bitmasks to lists of issue labels (None for rows without issues).
+    Only flagged rows pay for building their list.
+    """
+    labels = _CHECK_LABELS
+    bits = np.asarray(bits, dtype=np.uint32)
+    flagged = np.flatnonzero(bits)
+    issues = np.full(len(bits), None, dtype=object)
+    hits = (bits[flagged, None] >> np.arange(len(labels), dtype=np.uint32)) & 1
+    for pos, row in zip(flagged, hits.astype(np.bool_)):
+        issues[pos] = labels[row].tolist()
+    return issues
 
 def flag_missing_critical_fields(df: pd.DataFrame) -> pd.DataFrame:
     """
@@ -52,50 +151,42 @@ def flag_missing_critical_fields(df: pd.DataFrame) -> pd.DataFrame:
     Returns:
         pd.DataFrame: Same DataFrame with new 'data_issues' column listing per-row problems.
     """
-    issues = []
-
-    for _, row in df.iterrows():
-        row_issues = []
-
-        # Required time columns
-        if pd.isna(row.get("clock_in")):
-            row_issues.append("missing clock_in")
-        if pd.isna(row.get("clock_out")):
-            row_issues.append("missing clock_out")
-
-        # Partial lunch issues
-        if pd.notna(row.get("lunch_start")) and pd.isna(row.get("lunch_end")):
-            row_issues.append("missing lunch_end (partial lunch)")
-        if pd.notna(row.get("lunch_end")) and pd.isna(row.get("lunch_start")):
-            row_issues.append("missing lunch_start (partial lunch)")
-        if pd.notna(row.get("second_lunch_start")) and pd.isna(row.get("second_lunch_end")):
-            row_issues.append("missing second_lunch_end (partial second lunch)")
-        if pd.notna(row.get("second_lunch_end")) and pd.isna(row.get("second_lunch_start")):
-            row_issues.append("missing second_lunch_start (partial second lunch)")
-
-        # Required pay fields
-        if pd.isna(row.get("wage_rate")):
-            row_issues.append("missing wage_rate")
-        if pd.isna(row.get("total_pay_actual")):
-            row_issues.append("missing total_pay_actual")
-        if pd.isna(row.get("pay_date")):
-            row_issues.append("missing pay_date")
-
-        # Required employee info
-        if pd.isna(row.get("employment_status")):
-            row_issues.append("missing employment_status")
-        if pd.isna(row.get("exempt_status")):
-            row_issues.append("missing exempt_status")
-        if pd.isna(row.get("employee_id")):
-            row_issues.append("missing employee_id")
-        if pd.isna(row.get("date")):
-            row_issues.append("missing work date")
-
-        issues.append(row_issues if row_issues else None)
-
-    df["data_issues"] = issues
+    df["data_issues"] = issue_bits_to_lists(critical_issue_bits(df))
     return df
 
+def flag_missing_critical_fields_bits(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Same checks as flag_missing_critical_fields, but stores the compact uint32
+    'data_issues_bits' column instead of per-row lists. Suited to large inputs;
+    use issue_bits_to_lists on the flagged rows when building a report.
+
+    Parameters:
+        df (pd.DataFrame): The cleaned DataFrame to inspect.
+
+    Returns:
+        pd.DataFrame: Same DataFrame with new 'data_issues_bits' column (0 = no issues).
+    """
+    df["data_issues_bits"] = critical_issue_bits(df)
+    return df
+
+# Text spellings of waiver flags accepted when a waiver column was read as strings
+_WAIVER_TRUE = {"true", "t", "yes", "y", "1", "1.0"}
+_WAIVER_FALSE = {"false", "f", "no", "n", "0", "0.0"}
+
+def _waiver_to_bool(s: pd.Series):
+    """
+    Waiver column as a numpy bool array with missing values as False, or None if
+    it holds text that isn't a recognised yes/no spelling.
+    """
+    if pd.api.types.is_bool_dtype(s.dtype):
+        return s.astype("boolean").fillna(False).to_numpy(dtype=np.bool_)
+    tokens = s.astype("string").str.strip().str.lower()
+    is_true = tokens.isin(_WAIVER_TRUE).to_numpy(dtype=np.bool_)
+    is_false = tokens.isin(_WAIVER_FALSE).to_numpy(dtype=np.bool_)
+    if not (is_true | is_false | tokens.isna().to_numpy()).all():
+        return None
+    return is_true
+
 def fill_missing_waivers_with_false(df: pd.DataFrame) -> pd.DataFrame:
     """
     Fills missing waiver values with False, based on the assumption that blanks
@@ -105,10 +196,15 @@ def fill_missing_waivers_with_false(df: pd.DataFrame) -> pd.DataFrame:
         df (pd.DataFrame): The DataFrame with potential nulls in waiver fields.
 
     Returns:
-        pd.DataFrame: Updated DataFrame with missing waivers defaulted to False.
+        pd.DataFrame: Updated DataFrame with waiver columns as bool dtype,
+                      missing values defaulted to False. Text flags such as
+                      "Y" / "no" / "TRUE " are mapped to bools; a column with
+                      any other text keeps its values and only has blanks filled.
     """
-    df["first_meal_waiver_signed"] = df["first_meal_waiver_signed"].fillna(False)
-    df["second_meal_waiver_signed"] = df["second_meal_waiver_signed"].fillna(False)
+    # A 1-byte numpy bool column rather than an object column of True/False/NaN
+    for col in ("first_meal_waiver_signed", "second_meal_waiver_signed"):
+        flags = _waiver_to_bool(df[col])
+        df[col] = flags if flags is not None else df[col].fillna(False)
     return df
 
 def check_dq_all(client_name: str = "missing_client", filename: str = "missing_filename", corrected: bool = False):
@@ -123,8 +219,9 @@ def check_dq_all(client_name: str = "missing_client", filename: str = "missing_f
     - Export report of incomplete rows for client review
 
     Returns:
-        pd.DataFrame: Full dataset with a new 'data_issues' column
-                      (incomplete rows are not dropped).
+        pd.DataFrame: Full dataset with a new 'data_issues_bits' column
+                      (0 = no issues; decode with issue_bits_to_lists).
+                      Incomplete rows are not dropped.
     """
     if corrected:
         df = mainIO.load_corrected_data(client_name, filename)
@@ -135,9 +232,13 @@ def check_dq_all(client_name: str = "missing_client", filename: str = "missing_f
     
     df = fill_missing_waivers_with_false(df)
     
-    df_evaluated = flag_missing_critical_fields(df)
+    # Any 'data_issues' carried in the input is stale; the bits replace it
+    df_evaluated = flag_missing_critical_fields_bits(df.drop(columns="data_issues", errors="ignore"))
     
-    df_missing = df_evaluated[df_evaluated["data_issues"].notna()]
+    # Issue lists are only built for the flagged rows going into the report
+    bits = df_evaluated["data_issues_bits"].to_numpy()
+    df_missing = df_evaluated[bits != 0].drop(columns="data_issues_bits")
+    df_missing["data_issues"] = issue_bits_to_lists(bits[bits != 0])
     
     #repInc.report_incomplete_rows_global(df_missing, client_name, filename)
     repInc.report_incomplete_rows_global(df_missing, client_name, "testing_test")
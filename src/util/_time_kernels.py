@@ -0,0 +1,90 @@
+'''
+Kernels behind time_helpers.compute_all_time_features.
+
+Inputs are int64 microsecond views of datetime64 columns (NaT is the int64
+minimum), since numba cannot work on datetime64 directly. time_features uses
+the compiled _time_kernels_c extension if it has been built, then numba if
+installed, then plain numpy.
+'''
+
+import numpy as np
+
+try:
+    from numba import njit, prange
+except ImportError:  # numba is optional; the numpy kernel below is used instead
+    njit = None
+
+try:
+    from util._time_kernels_c import time_features as _time_features_c
+except ImportError:  # the compiled kernel is optional (see _time_kernels_c.pyx)
+    _time_features_c = None
+
+# NaT as stored in a datetime64 buffer viewed as int64
+_NAT = np.iinfo(np.int64).min
+
+_US_PER_SECOND = 1_000_000
+
+# Durations outside int32 seconds (about +/-68 years, e.g. a typo'd year) are
+# marked missing rather than narrowed, which would silently wrap them
+_INT32_MIN = np.iinfo(np.int32).min
+_INT32_MAX = np.iinfo(np.int32).max
+
+def _time_features_numpy(us, start_idx, end_idx):
+    """Feature-at-a-time numpy version of the time feature kernel."""
+    values = np.zeros((len(start_idx), us.shape[1]), dtype=np.int32)
+    missing = np.empty((len(start_idx), us.shape[1]), dtype=np.bool_)
+    # One int64 scratch buffer shared by every feature; only valid rows are
+    # written to it and read back
+    diff_us = np.empty(us.shape[1], dtype=np.int64)
+    for j in range(len(start_idx)):
+        start, end = us[start_idx[j]], us[end_idx[j]]
+        valid = (start != _NAT) & (end != _NAT)
+        np.subtract(end, start, out=diff_us, where=valid)
+        np.floor_divide(diff_us, _US_PER_SECOND, out=diff_us, where=valid)
+        valid &= (diff_us >= _INT32_MIN) & (diff_us <= _INT32_MAX)
+        np.copyto(values[j], diff_us, casting="unsafe", where=valid)
+        np.logical_not(valid, out=missing[j])
+    return values, missing
+
+if njit is not None:
+    @njit(parallel=True, cache=True)
+    def _time_features_numba(us, start_idx, end_idx):
+        """Single parallel sweep over rows computing every feature for each row."""
+        nat = np.iinfo(np.int64).min
+        n = us.shape[1]
+        values = np.zeros((start_idx.shape[0], n), dtype=np.int32)
+        missing = np.empty((start_idx.shape[0], n), dtype=np.bool_)
+        for i in prange(n):
+            for j in range(start_idx.shape[0]):
+                a = us[start_idx[j], i]
+                b = us[end_idx[j], i]
+                ok = a != nat and b != nat
+                if ok:
+                    d = (b - a) // _US_PER_SECOND
+                    ok = _INT32_MIN <= d <= _INT32_MAX
+                if ok:
+                    values[j, i] = d
+                    missing[j, i] = False
+                else:
+                    missing[j, i] = True
+        return values, missing
+
+def time_features(us, start_idx, end_idx):
+    """
+    Whole seconds from start to end for each (start, end) pair of rows in us.
+
+    Parameters:
+        us (np.ndarray): int64 array of shape (columns, rows) holding microsecond timestamps.
+        start_idx (np.ndarray): int64 row index into us of each feature's start column.
+        end_idx (np.ndarray): int64 row index into us of each feature's end column.
+
+    Returns:
+        tuple: (int32 seconds, bool missing mask), both of shape (features, rows);
+               a row is missing (value 0) where either side is NaT or the
+               duration doesn't fit in int32.
+    """
+    if _time_features_c is not None:
+        return _time_features_c(us, start_idx, end_idx)
+    if njit is not None:
+        return _time_features_numba(us, start_idx, end_idx)
+    return _time_features_numpy(us, start_idx, end_idx)
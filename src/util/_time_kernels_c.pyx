@@ -0,0 +1,49 @@
+# cython: language_level=3, boundscheck=False, wraparound=False
+'''
+Ahead-of-time compiled version of the fused time feature kernel in
+_time_kernels.py, for runs where numba's per-process JIT warmup outweighs
+the work (short batch jobs). _time_kernels uses it automatically when the
+compiled module is importable; build it in place with:
+
+    cythonize -i src/util/_time_kernels_c.pyx
+'''
+
+import numpy as np
+from libc.stdint cimport int64_t, uint8_t, INT64_MIN, INT32_MIN, INT32_MAX
+
+def time_features(const int64_t[:, ::1] us, const int64_t[::1] start_idx,
+                  const int64_t[::1] end_idx):
+    """
+    Whole seconds from start to end for each (start, end) pair of rows in us.
+    Same contract as _time_kernels.time_features.
+
+    Returns:
+        tuple: (int32 seconds, bool missing mask), both of shape (features, rows).
+    """
+    cdef Py_ssize_t k = start_idx.shape[0]
+    cdef Py_ssize_t n = us.shape[1]
+    values_arr = np.zeros((k, n), dtype=np.int32)
+    # Filled as uint8 and returned as a bool view (same layout, no numpy headers needed)
+    missing_arr = np.empty((k, n), dtype=np.uint8)
+    cdef int[:, ::1] values = values_arr
+    cdef uint8_t[:, ::1] missing = missing_arr
+    cdef Py_ssize_t i, j
+    cdef int64_t a, b, d
+    cdef bint ok
+    with nogil:
+        for j in range(k):
+            for i in range(n):
+                a = us[start_idx[j], i]
+                b = us[end_idx[j], i]
+                ok = a != INT64_MIN and b != INT64_MIN
+                if ok:
+                    # cdivision is off, so // floors like numpy's floor_divide
+                    d = (b - a) // 1000000
+                    # Out-of-range durations are missing, never narrowed (wrapped)
+                    ok = INT32_MIN <= d <= INT32_MAX
+                if ok:
+                    values[j, i] = <int>d
+                    missing[j, i] = 0
+                else:
+                    missing[j, i] = 1
+    return values_arr, missing_arr.view(np.bool_)
@@ -5,7 +5,9 @@ Handles core file input/output operations for the GV ETL Pipeline.
 
 This module centralizes all loading and saving of:
 - Raw CSV timecard data from the client’s `data/raw` folder.
-- Processed CSV outputs into the client’s `data/processed` folder.
+- Processed outputs into the client’s `data/processed` folder
+  (Parquet as the primary format, CSV as an optional export).
+- Cached cleaned datasets (Parquet) under `data/processed/_cache`.
 
 All paths are relative to the repository’s structure to keep the code portable.
 The functions are designed to fail loudly (raise exceptions) if expected directories are missing,
@@ -16,8 +18,44 @@ Created on Aug 9, 2025
 '''
 
 import pandas as pd
+import pyarrow.csv as pacsv
+from pandas.tseries.api import guess_datetime_format
 import os
 
+# Timestamp columns parsed once at load so later to_datetime calls are no-ops
+DATETIME_COLS = [
+    "date", "pay_date", "clock_in", "clock_out",
+    "lunch_start", "lunch_end", "second_lunch_start", "second_lunch_end",
+]
+
+# Cleaned-data cache is evicted least-recently-used first once it grows past this size
+CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+
+def _parse_datetime_strict(s: pd.Series) -> pd.Series:
+    """
+    Parses a column with the format inferred from its first value.
+    Returns the column unchanged if no format can be inferred or any value fails.
+    """
+    first = s.first_valid_index()
+    if first is None or not isinstance(s.loc[first], str):
+        return s
+    fmt = guess_datetime_format(s.loc[first])
+    if fmt is None:
+        return s
+    try:
+        return pd.to_datetime(s, format=fmt)
+    except (ValueError, TypeError):
+        return s
+
+
+def get_raw_data_path(client_name: str = "missing_client", filename: str = "missing_filename") -> str:
+    """
+    Returns the path of a raw CSV file in the client's `data/raw` folder.
+    The path is not checked for existence.
+    """
+    return os.path.join("../../data", client_name, f"data/raw/{filename}.csv")
+
 
 def load_raw_data(client_name: str = "missing_client", filename: str = "missing_filename") -> pd.DataFrame:
     """
@@ -28,7 +66,8 @@ def load_raw_data(client_name: str = "missing_client", filename: str = "missing_
         filename (str): Name of the CSV file (without extension) to load.
 
     Returns:
-        pd.DataFrame: Raw dataset as a Pandas DataFrame.
+        pd.DataFrame: Raw dataset as a Pandas DataFrame with Arrow-backed dtypes;
+                      DATETIME_COLS that parse cleanly are datetime64.
 
     Raises:
         FileNotFoundError: If the base path, client folder, or target file is missing.
@@ -45,12 +84,24 @@ def load_raw_data(client_name: str = "missing_client", filename: str = "missing_
         raise FileNotFoundError(f"Client folder not found: {client_path}")
     
     # Full path to the raw CSV file
-    file_path = os.path.join(client_path, f"data/raw/{filename}.csv")
+    file_path = get_raw_data_path(client_name, filename)
     if not os.path.exists(file_path):
         raise FileNotFoundError(f"Raw data file not found: {file_path}")
     
-    # Load CSV into DataFrame
-    df = pd.read_csv(file_path)
+    # Load CSV through Arrow's multithreaded reader; columns stay Arrow-backed
+    # so string cleanup downstream runs on Arrow kernels
+    table = pacsv.read_csv(
+        file_path,
+        parse_options=pacsv.ParseOptions(),
+        convert_options=pacsv.ConvertOptions(strings_can_be_null=True),
+    )
+    df = table.to_pandas(types_mapper=pd.ArrowDtype)
+
+    # Parse timestamps once here, like read_csv(parse_dates=...): a column is only
+    # converted if every value matches its inferred format, otherwise it stays text
+    for col in DATETIME_COLS:
+        if col in df.columns:
+            df[col] = _parse_datetime_strict(df[col])
     print(f"{filename}.csv loaded from raw folder.")
     return df
 
@@ -81,20 +132,45 @@ def save_cleaned_raw_data(df: pd.DataFrame, client_name: str = "missing_client",
     df.to_csv(file_path, index=False)
     print(f"{filename}_cleaned.csv saved to processed folder.")
     
+def save_cleaned_raw_data_parquet(df: pd.DataFrame, client_name: str = "missing_client", filename: str = "missing_filename") -> None:
+    """
+    Saves a cleaned or processed DataFrame as Parquet (zstd, dictionary-encoded strings)
+    to the client's `data/processed` folder. Column types are preserved, so loaders
+    get datetime/bool columns back without re-parsing.
+
+    Parameters:
+        df (pd.DataFrame): DataFrame to save.
+        client_name (str): Name of the client folder inside `../../data/`.
+        filename (str): Base name for the saved file (without `_cleaned` or extension).
+
+    Raises:
+        FileNotFoundError: If the processed folder does not exist.
+    """
+    base_path = "../../data"
+    processed_path = os.path.join(base_path, client_name, "data/processed")
+    if not os.path.exists(processed_path):
+        raise FileNotFoundError(f"Processed folder missing: {processed_path}")
+
+    file_path = os.path.join(processed_path, f"{filename}_cleaned.parquet")
+    df.to_parquet(file_path, engine="pyarrow", compression="zstd", use_dictionary=True, index=False)
+    print(f"{filename}_cleaned.parquet saved to processed folder.")
+    
 def load_cleaned_data(client_name: str = "missing_client", filename: str = "missing_filename",
                       base_path = "../../../data") -> pd.DataFrame:
     """
-    Loads a cleaned CSV file from the processed data folder for a given client.
+    Loads a cleaned dataset from the processed data folder for a given client.
 
-    This function assumes the cleaned file is located at:
+    The Parquet file is preferred, unless the CSV is newer (e.g. it was edited by
+    hand after the pipeline wrote both) or the Parquet doesn't exist:
+    '../../../data/{client_name}/data/processed/{filename}_cleaned.parquet'
     '../../../data/{client_name}/data/processed/{filename}_cleaned.csv'
 
     Parameters:
         client_name (str): Name of the client folder (default is "missing_client").
-        filename (str): Name of the cleaned CSV file without extension (default is "missing_filename").
+        filename (str): Name of the cleaned file without extension (default is "missing_filename").
 
     Returns:
-        pd.DataFrame: Loaded DataFrame from the specified CSV file.
+        pd.DataFrame: Loaded DataFrame from the specified file.
 
     Raises:
         FileNotFoundError: If the base path, client folder, or file does not exist.
@@ -110,8 +186,17 @@ def load_cleaned_data(client_name: str = "missing_client", filename: str = "miss
     if not os.path.exists(client_path):
         raise FileNotFoundError(f"Client folder not found: {client_path}")
     
-    # Full path to the cleaned CSV file
+    # Prefer the typed Parquet output; the writers save it after the CSV, so a
+    # strictly newer CSV means it was changed since and is the current data
+    parquet_path = os.path.join(client_path, f"data/processed/{filename}_cleaned.parquet")
     file_path = os.path.join(client_path, f"data/processed/{filename}_cleaned.csv")
+    if os.path.exists(parquet_path) and not (
+        os.path.exists(file_path) and os.path.getmtime(file_path) > os.path.getmtime(parquet_path)
+    ):
+        df = pd.read_parquet(parquet_path, engine="pyarrow")
+        print(f"{filename}_cleaned.parquet loaded from the processed folder.")
+        return df
+
     if not os.path.exists(file_path):
         raise FileNotFoundError(f"Cleaned data file not found: {file_path}")
     
@@ -153,5 +238,58 @@ def save_aux_report(df: pd.DataFrame, client_name: str="client_name", filename:
     file_path = os.path.join(client_path,f"{filename}_duplication_report.csv")
     df.to_csv(file_path, index=False)
     print(f"{filename}_duplication_report.csv saved to duplication_report_folder.")
-    
-    
+
+
+def _get_cache_path(client_name: str, cache_key: str) -> str:
+    return os.path.join("../../data", client_name, "data/processed/_cache", f"{cache_key}.parquet")
+
+
+def load_cached_data(client_name: str = "missing_client", cache_key: str = "missing_key") -> pd.DataFrame | None:
+    """
+    Loads a cached cleaned dataset from the client's `data/processed/_cache` folder.
+
+    Parameters:
+        client_name (str): Name of the client folder inside `../../data/`.
+        cache_key (str): Content hash identifying the cached dataset.
+
+    Returns:
+        pd.DataFrame | None: Cached DataFrame, or None on a cache miss.
+    """
+    file_path = _get_cache_path(client_name, cache_key)
+    if not os.path.exists(file_path):
+        return None
+
+    # Touch on hit so eviction drops the least recently used entries first
+    os.utime(file_path)
+    df = pd.read_parquet(file_path, engine="pyarrow")
+    print(f"{cache_key[:12]}.parquet loaded from cache.")
+    return df
+
+
+def save_cached_data(df: pd.DataFrame, client_name: str = "missing_client", cache_key: str = "missing_key") -> None:
+    """
+    Saves a cleaned dataset to the client's `data/processed/_cache` folder and evicts
+    the least recently used entries once the cache exceeds CACHE_MAX_BYTES.
+
+    Raises:
+        FileNotFoundError: If the processed folder does not exist.
+    """
+    processed_path = os.path.join("../../data", client_name, "data/processed")
+    if not os.path.exists(processed_path):
+        raise FileNotFoundError(f"Processed folder missing: {processed_path}")
+
+    file_path = _get_cache_path(client_name, cache_key)
+    cache_dir = os.path.dirname(file_path)
+    os.makedirs(cache_dir, exist_ok=True)
+    df.to_parquet(file_path, engine="pyarrow", compression="zstd", index=False)
+
+    entries = sorted(
+        (e for e in os.scandir(cache_dir) if e.name.endswith(".parquet")),
+        key=lambda e: e.stat().st_mtime,
+    )
+    total = sum(e.stat().st_size for e in entries)
+    for entry in entries:
+        if total <= CACHE_MAX_BYTES or entry.path == file_path:
+            break
+        total -= entry.stat().st_size
+        os.remove(entry.path)
@@ -4,54 +4,225 @@ Created on Aug 12, 2025
 @author: jarpy
 '''
 
+import numpy as np
 import pandas as pd 
-from datetime import timedelta 
+from pandas.tseries.api import guess_datetime_format
+import util._time_kernels as _time_kernels
 
-def convert_dates_and_datetimes(df, date_cols=None, datetime_cols=None):
+# Below this many values strings are parsed directly, without deduplicating first
+_CACHE_MIN_ROWS = 1000
+
+# Resolution floor_datetimes returns. Microseconds cover +/-290k years, so
+# typo'd years (e.g. 3024) never wrap the way they would in nanoseconds
+DATETIME_UNIT = "us"
+
+# Time features as (output column, start column, end column), in whole seconds
+# stored as nullable Int32 (durations beyond int32, about 68 years, are NA)
+TIME_FEATURES = [
+    ("shift_length", "clock_in", "clock_out"),
+    ("time_to_1st_lunch", "clock_in", "lunch_start"),
+    ("first_lunch_duration", "lunch_start", "lunch_end"),
+    ("time_to_2nd_lunch", "clock_in", "second_lunch_start"),
+    ("second_lunch_duration", "second_lunch_start", "second_lunch_end"),
+]
+
+# Kernel inputs derived from TIME_FEATURES once at import: the distinct columns
+# involved, for each feature the index of its start and end column, and the
+# output column names
+_FEATURE_COLS = list(dict.fromkeys(c for _, start, end in TIME_FEATURES for c in (start, end)))
+_FEATURE_START_IDX = np.array([_FEATURE_COLS.index(start) for _, start, _ in TIME_FEATURES], dtype=np.int64)
+_FEATURE_END_IDX = np.array([_FEATURE_COLS.index(end) for _, _, end in TIME_FEATURES], dtype=np.int64)
+_FEATURE_NAMES = [out for out, _, _ in TIME_FEATURES]
+
+# Kernel indices for a single (start, end) pair, used by the compute_* functions
+_PAIR_START_IDX = np.array([0], dtype=np.int64)
+_PAIR_END_IDX = np.array([1], dtype=np.int64)
+
+def _infer_format(s):
+    """
+    Guesses the datetime format from the first non-null string value, the same
+    value pandas itself would infer from. Returns None if nothing can be guessed.
+    """
+    first = s.first_valid_index()
+    if first is None:
+        return None
+    value = s.loc[first]
+    return guess_datetime_format(value) if isinstance(value, str) else None
+
+def _fast_to_datetime(s, fmt=None):
+    """
+    Parses a string Series to a datetime64 numpy array, parsing each distinct
+    string only once. Timeclock exports repeat the same timestamps across many
+    rows, so the unique set is usually far smaller than the column.
+
+    Parameters:
+        s (pd.Series): Strings to parse; unparseable values become NaT.
+        fmt (str): Format passed to to_datetime, or None to infer it.
+
+    Returns:
+        np.ndarray: datetime64 array aligned with s.
+    """
+    if len(s) < _CACHE_MIN_ROWS:
+        # Deduplicating only pays off on larger inputs
+        return pd.to_datetime(s, errors="coerce", format=fmt, cache=False).to_numpy()
+    codes, uniques = pd.factorize(s)
+    parsed = pd.to_datetime(uniques, errors="coerce", format=fmt, cache=False).to_numpy()
+    # Missing values have code -1, which picks the NaT appended at the end
+    return np.append(parsed, np.array("NaT", dtype=parsed.dtype))[codes]
+
+def _parse_datetime_columns(df, cols, formats=None):
+    """
+    Parses columns to datetime, batching columns that share a format into a
+    single to_datetime call with an explicit format= (fast C parser).
+
+    Parameters:
+        formats (dict): Optional column -> format; other columns use the inferred format.
+
+    Returns:
+        dict: Column name -> parsed datetime64 numpy array.
+    """
+    formats = formats or {}
+    n = len(df)
+    parsed = {}
+    groups = {}
+    for col in cols:
+        s = df[col]
+        if pd.api.types.is_datetime64_any_dtype(s):
+            # Already parsed upstream
+            parsed[col] = s.to_numpy()
+        elif not s.notna().any():
+            # Empty or all-null: nothing to parse (to_datetime's cache setup is
+            # pathologically slow on all-NaT input)
+            parsed[col] = np.full(n, np.datetime64("NaT"), dtype=f"datetime64[{DATETIME_UNIT}]")
+        else:
+            fmt = formats.get(col) or _infer_format(s)
+            groups.setdefault(fmt, []).append(col)
+
+    for fmt, group in groups.items():
+        stacked = pd.concat([df[col] for col in group], ignore_index=True)
+        values = _fast_to_datetime(stacked, fmt)
+        for i, col in enumerate(group):
+            parsed[col] = values[i * n:(i + 1) * n]
+    return parsed
+
+def floor_datetimes(s, unit):
+    """
+    Parses to datetime if needed and truncates to `unit` ("D" for dates, "m" for
+    minutes) with a numpy cast instead of the .dt offset arithmetic. NaT is preserved.
+
+    Parameters:
+        s (pd.Series or np.ndarray): Datetime values, or strings to parse
+                                     (unparseable values become NaT).
+        unit (str): numpy datetime unit to truncate to.
+
+    Returns:
+        np.ndarray: Truncated values as datetime64 in DATETIME_UNIT.
+    """
+    if pd.api.types.is_datetime64_any_dtype(s):
+        parsed = s
+    elif not s.notna().any():
+        # Empty or all-null: skip to_datetime, whose cache setup is
+        # pathologically slow on all-NaT input
+        return np.full(len(s), np.datetime64("NaT"), dtype=f"datetime64[{DATETIME_UNIT}]")
+    else:
+        parsed = pd.to_datetime(s, errors="coerce")
+    # Truncate in the values' own resolution (never cast up to ns first, which
+    # silently wraps dates outside 1677-2262), then widen to DATETIME_UNIT
+    return (np.asarray(parsed)
+              .astype(f"datetime64[{unit}]")
+              .astype(f"datetime64[{DATETIME_UNIT}]"))
+
+def convert_dates_and_datetimes(df, date_cols=None, datetime_cols=None,
+                                date_format=None, datetime_format=None):
     """
     Converts string columns to date or datetime format while preserving nulls.
+    The DataFrame is modified in place.
     
     Parameters:
         df (pd.DataFrame): Input DataFrame.
-        date_cols (list): Columns to convert to date-only (normalized datetime64).
+        date_cols (list): Columns to convert to date-only (midnight datetime64 in DATETIME_UNIT).
         datetime_cols (list): Columns to convert to full datetime.
+        date_format (str): Known format of the date columns (e.g. "%Y-%m-%d" or "ISO8601").
+                           If None, each column's format is inferred from its first value.
+        datetime_format (str): Known format of the datetime columns, as above.
     
     Returns:
-        pd.DataFrame: Updated DataFrame with proper date/datetime types.
+        None: The converted columns are written back into df.
     """
-    date_cols = date_cols or []
-    datetime_cols = datetime_cols or []
+    # Skip requested columns the DataFrame doesn't have (order is kept)
+    present = set(df.columns)
+    date_cols = [col for col in date_cols or [] if col in present]
+    datetime_cols = [col for col in datetime_cols or [] if col in present]
+
+    formats = {col: date_format for col in date_cols}
+    formats.update({col: datetime_format for col in datetime_cols})
+    parsed = _parse_datetime_columns(df, date_cols + datetime_cols, formats)
 
-    # Convert to date-only
+    # Convert to date-only (truncate to midnight; NaT is preserved)
     for col in date_cols:
-        if col in df.columns:
-            df[col] = pd.to_datetime(df[col], errors="coerce").dt.normalize()
+        df[col] = floor_datetimes(parsed[col], "D")
 
     # Convert to full datetime
     for col in datetime_cols:
-        if col in df.columns:
-            df[col] = pd.to_datetime(df[col], errors="coerce")
-    
-    return df
+        df[col] = parsed[col]
+
+def _us_values(df, col):
+    """
+    Int64 microsecond view of a datetime column (NaT becomes the int64 minimum). as_unit
+    converts in range-checked fashion: a value that doesn't fit raises
+    OutOfBoundsDatetime instead of wrapping (microseconds cover +/-290k years,
+    so parsed timestamps always fit).
+    """
+    return df[col].dt.as_unit("us").to_numpy().view("i8")
+
+def _seconds_between(df, start_col, end_col):
+    """
+    Whole seconds from start_col to end_col as a nullable Int32 array; NA where
+    either side is missing or the duration doesn't fit in int32. Runs the same
+    kernel as compute_all_time_features on a two-column stack.
+    """
+    us = np.empty((2, len(df)), dtype=np.int64)
+    us[0] = _us_values(df, start_col)
+    us[1] = _us_values(df, end_col)
+    values, missing = _time_kernels.time_features(us, _PAIR_START_IDX, _PAIR_END_IDX)
+    return pd.arrays.IntegerArray(values[0], missing[0])
+
+def compute_all_time_features(df):
+    """
+    Computes every TIME_FEATURES column in one pass. Each input column is
+    converted to its int64 microsecond view once and shared by all features
+    that use it (clock_in feeds three of them); the subtraction runs in a
+    single kernel over all rows (numba-parallel when numba is installed).
+
+    The five results come back as one (5, n) int32 array plus a missing mask;
+    each feature column wraps its row of that output without copying it.
+
+    Parameters:
+        df (pd.DataFrame): DataFrame containing the clock and lunch datetime columns.
+
+    Returns:
+        None: The five time feature columns (Int32 seconds) are added to df in place.
+    """
+    us = np.empty((len(_FEATURE_COLS), len(df)), dtype=np.int64)
+    for k, col in enumerate(_FEATURE_COLS):
+        us[k] = _us_values(df, col)
+
+    values, missing = _time_kernels.time_features(us, _FEATURE_START_IDX, _FEATURE_END_IDX)
+    # One assignment per feature: nullable Int32 columns are extension arrays,
+    # which pandas always stores one per block, so there is no single-block
+    # insert to be had without going back to float64/NaN features
+    for j, name in enumerate(_FEATURE_NAMES):
+        df[name] = pd.arrays.IntegerArray(values[j], missing[j])
 
 def compute_shift_length(df):
     """
     Computes total shift length in seconds for each row 
     where both clock_in and clock_out are present.
 
-    Stores result in a new column called 'shift_length'.
+    Stores result in a new column called 'shift_length' (df is modified in place).
     """
-    # Initialize with NaN
-    df["shift_length"] = pd.NA
-    
-    # Compute only valid pairs
-    mask = df["clock_in"].notna() & df["clock_out"].notna()
-    
-    df.loc[mask, "shift_length"] = (
-        df.loc[mask,"clock_out"] - df.loc[mask,"clock_in"]
-    ).dt.total_seconds()
-    
-    return df 
+    # NA where either clock time is missing
+    df["shift_length"] = _seconds_between(df, "clock_in", "clock_out")
 
 def compute_time_to_1st_lunch(df):
     """
@@ -61,10 +232,9 @@ def compute_time_to_1st_lunch(df):
         df (pd.DataFrame): DataFrame containing 'clock_in' and 'lunch_start' datetime columns.
 
     Returns:
-        pd.DataFrame: Updated DataFrame with a new column 'time_to_1st_lunch' in seconds.
+        None: Adds the column 'time_to_1st_lunch' (seconds) to df in place.
     """
-    df["time_to_1st_lunch"] = (df["lunch_start"] - df["clock_in"]).dt.total_seconds()
-    return df
+    df["time_to_1st_lunch"] = _seconds_between(df, "clock_in", "lunch_start")
 
 def compute_1st_lunch_duration(df):
     """
@@ -74,10 +244,9 @@ def compute_1st_lunch_duration(df):
         df (pd.DataFrame): DataFrame containing 'lunch_start' and 'lunch_end' datetime columns.
 
     Returns:
-        pd.DataFrame: Updated DataFrame with a new column 'first_lunch_duration' in seconds.
+        None: Adds the column 'first_lunch_duration' (seconds) to df in place.
     """
-    df["first_lunch_duration"] = (df["lunch_end"] - df["lunch_start"]).dt.total_seconds()
-    return df
+    df["first_lunch_duration"] = _seconds_between(df, "lunch_start", "lunch_end")
 
 
 def compute_time_to_2nd_lunch(df):
@@ -88,10 +257,9 @@ def compute_time_to_2nd_lunch(df):
         df (pd.DataFrame): DataFrame containing 'clock_in' and 'second_lunch_start' datetime columns.
 
     Returns:
-        pd.DataFrame: Updated DataFrame with a new column 'time_to_2nd_lunch' in seconds.
+        None: Adds the column 'time_to_2nd_lunch' (seconds) to df in place.
     """
-    df["time_to_2nd_lunch"] = (df["second_lunch_start"] - df["clock_in"]).dt.total_seconds()
-    return df
+    df["time_to_2nd_lunch"] = _seconds_between(df, "clock_in", "second_lunch_start")
 
 def compute_2nd_lunch_duration(df):
     """
@@ -101,7 +269,6 @@ def compute_2nd_lunch_duration(df):
         df (pd.DataFrame): DataFrame containing 'second_lunch_start' and 'second_lunch_end' datetime columns.
 
     Returns:
-        pd.DataFrame: Updated DataFrame with a new column 'second_lunch_duration' in seconds.
+        None: Adds the column 'second_lunch_duration' (seconds) to df in place.
     """
-    df["second_lunch_duration"] = (df["second_lunch_end"] - df["second_lunch_start"]).dt.total_seconds()
-    return df
\ No newline at end of file
+    df["second_lunch_duration"] = _seconds_between(df, "second_lunch_start", "second_lunch_end")
\ No newline at end of file
@@ -8,10 +8,16 @@ Author: John Medina
 Date: August 9, 2025
 """
 
+import logging
 import os
+from concurrent.futures import ThreadPoolExecutor
+
+log = logging.getLogger(__name__)
 
 # Define relative subfolder paths required inside each client folder
-CLIENT_STRUCTURE = [
+# (dict.fromkeys drops repeated entries while keeping their order; separators
+# are converted to os.sep once here so paths can be built by concatenation)
+CLIENT_STRUCTURE = tuple(rel.replace("/", os.sep) for rel in dict.fromkeys([
     "data/raw",
     "data/processed",
     "data/corrected",
@@ -23,35 +29,64 @@ CLIENT_STRUCTURE = [
     "data/mapping",
     "documentation"
     # Add new folders here with proper structure (relative to client folder)
-]
+]))
+
+def _ensure_client_structure(client_base_path):
+    """
+    Creates any missing CLIENT_STRUCTURE folders under one client folder.
+
+    Args:
+        client_base_path (str): Path to the client folder
+
+    Returns:
+        tuple: (number of folders created, number that already existed)
+    """
+    created = existing = 0
+    prefix = client_base_path + os.sep
+    for rel_path in CLIENT_STRUCTURE:
+        full_path = prefix + rel_path
+        # makedirs does the existence check itself (no separate stat); an
+        # existing non-directory at the path is still an error
+        try:
+            os.makedirs(full_path)
+        except FileExistsError:
+            if not os.path.isdir(full_path):
+                raise
+            existing += 1
+        else:
+            created += 1
+            log.debug("Created missing folder: %s", full_path)
+    return created, existing
 
 def update_client_structure(base_data_dir="../../data"):
     """
     Updates the folder structure for all clients under the given base directory.
+    Clients are processed concurrently in a thread pool (the work is filesystem
+    calls, which release the GIL).
 
     Args:
         base_data_dir (str): Path to the main /data directory
     """
     if not os.path.exists(base_data_dir):
-        print(f" Base data directory not found: {base_data_dir}")
+        log.warning("Base data directory not found: %s", base_data_dir)
         return
 
-    client_names = [
-        name for name in os.listdir(base_data_dir)
-        if os.path.isdir(os.path.join(base_data_dir, name))
-    ]
+    # scandir entries carry the file type from the directory listing,
+    # so is_dir() normally needs no extra stat per entry; entry.path is the
+    # already-joined client path
+    with os.scandir(base_data_dir) as entries:
+        clients = [entry for entry in entries if entry.is_dir()]
+    client_names = [entry.name for entry in clients]
+    client_paths = [entry.path for entry in clients]
 
-    for client in client_names:
-        print(f"\nChecking structure for client: {client}")
-        client_base_path = os.path.join(base_data_dir, client)
+    with ThreadPoolExecutor(max_workers=min(32, len(client_paths) or 1)) as executor:
+        # list() waits for every client and re-raises any worker error
+        counts = list(executor.map(_ensure_client_structure, client_paths))
 
-        for rel_path in CLIENT_STRUCTURE:
-            full_path = os.path.join(client_base_path, rel_path)
-            if not os.path.exists(full_path):
-                os.makedirs(full_path)
-                print(f"Created missing folder: {rel_path}")
-            else:
-                print(f"Already exists: {rel_path}")
+    # One summary line per client, logged from the main thread
+    for client, (created, existing) in zip(client_names, counts):
+        log.info("%s: created %d, existing %d", client, created, existing)
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
     update_client_structure()